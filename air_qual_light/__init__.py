@@ -1,21 +1,26 @@
 import os
 
 # Allow developmnet on a non-rasberry pi hardware.
-RASPBERRY_PI_HARDWARE = os.getenv('RASPBERRY_PI_HARDWARE', True)
-if RASPBERRY_PI_HARDWARE is not True:
-    if RASPBERRY_PI_HARDWARE.upper() in ('TRUE', 'YES'):
-        RASPBERRY_PI_HARDWARE = True
-    else:
-        RASPBERRY_PI_HARDWARE = False
+RASPBERRY_PI_HARDWARE = os.getenv('RASPBERRY_PI_HARDWARE', 'TRUE').strip().upper() in ('TRUE', 'YES', '1')
 
 try:
     from setuptools_scm import get_version
     __version__ = version = get_version(root='..', relative_to=__file__)
 except (ImportError, LookupError):
     try:
-        from pkg_resources import get_distribution, DistributionNotFound
-        __version__ = version = get_distribution(__name__).version
-    except (ImportError, DistributionNotFound):
-        raise ValueError('Cannot find version number from scm or pkg resources')
+        from importlib.metadata import version as get_distribution_version, PackageNotFoundError
+    except ImportError:  # Python 3.7, fall back on the slow to import pkg_resources
+        try:
+            from pkg_resources import get_distribution, DistributionNotFound as PackageNotFoundError
+        except ImportError:
+            raise ValueError('Cannot find version number from scm or package metadata')
+
+        def get_distribution_version(name: str) -> str:
+            return get_distribution(name).version
+
+    try:
+        __version__ = version = get_distribution_version(__name__)
+    except PackageNotFoundError:
+        raise ValueError('Cannot find version number from scm or package metadata')
 
 base_version = '.'.join(version.split('.')[:3])
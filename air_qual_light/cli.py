@@ -2,16 +2,17 @@ import sys
 import logging
 
 from configparser import ConfigParser
-from datetime import datetime, time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple
-from time import sleep
+from typing import Dict, List, Optional, Tuple
+from time import localtime, monotonic, sleep
 
 import click
+import numpy as np
 
 from air_qual_light import __version__
-from air_qual_light.data import Sensor, calculate_concencus_aqi
-from air_qual_light.sensor_request import update_sensor_data
+from air_qual_light.data import Sensor, calculate_aqi_array, calculate_concencus_aqi
+from air_qual_light.sensor_request import update_sensor_data, update_sensor_data_bulk
 from air_qual_light.led import Led
 
 
@@ -19,15 +20,40 @@ log = logging.getLogger()
 CONFIG_FILES = list(Path(__file__).resolve().parent.parent.joinpath('config').glob('*.conf'))
 
 
-def read_config_file(config_file: str) -> Tuple[List[Sensor], ConfigParser]:
+@dataclass(frozen=True)
+class RuntimeConfig:
+    api_key: str = field(repr=False)
+    api_url_tmpl: str
+    api_bulk_url: Optional[str]
+    update_frequency: int
+    start_time: int  # Seconds of the day
+    end_time: int  # Seconds of the day
+    neopixel: Dict[str, str]
+
+
+def read_config_file(config_file: str) -> Tuple[RuntimeConfig, List[Sensor]]:
 
     config = ConfigParser()
     config.read(config_file)
 
-    sensors = [Sensor(name, sensor_str, config['generic']['api_url_tmpl'])
+    # Resolve everything once, ConfigParser interpolates on every lookup.
+    generic = dict(config['generic'])
+    start_hour, end_hour = [int(h) for h in generic['active_time'].strip().split('-')]
+
+    runtime_config = RuntimeConfig(
+        api_key=generic['api_key'],
+        api_url_tmpl=generic['api_url_tmpl'],
+        api_bulk_url=generic.get('api_bulk_url'),
+        update_frequency=int(generic['update_frequency']),
+        start_time=start_hour * 3600,
+        end_time=end_hour * 3600,
+        neopixel=dict(config['neopixel'])
+    )
+
+    sensors = [Sensor(name, sensor_str, runtime_config.api_url_tmpl)
                for name, sensor_str in config['sensors'].items()]
 
-    return config, sensors
+    return runtime_config, sensors
 
 
 def setup_logging(log_level: str):
@@ -43,8 +69,10 @@ def setup_logging(log_level: str):
     log.addHandler(handler)
 
 
-def is_time_between(start: time, end: time) -> bool:
-    now = datetime.now().time()
+def is_time_between(start: int, end: int) -> bool:
+    # start and end are given as seconds of the day.
+    now = localtime()
+    now = now.tm_hour * 3600 + now.tm_min * 60 + now.tm_sec
 
     if start < end:
         return now >= start and now <= end
@@ -63,41 +91,52 @@ def main(config_file: str, log_level: str):
     log.info(f'Loaded config file(s): {config_file}')
     config, sensors = read_config_file(config_file)
 
-    api_key = config['generic']['api_key']
+    api_key = config.api_key
     log.info(f'Loaded API_KEY: {api_key[:8]}...')
 
-    # Load active time
-    start_time, end_time = config['generic']['active_time'].strip().split('-')
-    start_time, end_time = time(int(start_time)), time(int(end_time))
+    start_time, end_time = config.start_time, config.end_time
 
-    log.debug(f'Sensors: {sensors}')
+    log.debug('Sensors: %s', sensors)
 
     log.info('Init LED object')
-    led = Led(config)
+    led = Led(config.neopixel)
 
-    update_frequency = int(config['generic']['update_frequency'])
+    update_frequency = config.update_frequency
     log.info(f'Starting main loop with a {update_frequency}s update frequency.')
 
     led.working_light(3)
 
     unhealty = 0
+    next_run = monotonic()
     while True:
         try:
 
             if is_time_between(start_time, end_time):
 
-                update_sensor_data(sensors, api_key)
-                log.debug(f'Sensors: {sensors}')
+                if config.api_bulk_url:
+                    update_sensor_data_bulk(sensors, api_key, config.api_bulk_url)
+                else:
+                    update_sensor_data(sensors, api_key)
+                log.debug('Sensors: %s', sensors)
 
-                pm2_5_aqi = calculate_concencus_aqi([s.us_epa_pm2_4_aqi for s in sensors])
-                log.debug(f'Got a new pm2.5 AQI value: {pm2_5_aqi}')
+                pm_values = np.fromiter((pm for pm in (s.pm2_5_atm for s in sensors) if pm is not None),
+                                        dtype=np.float64)
+                pm2_5_aqi = calculate_concencus_aqi(calculate_aqi_array(pm_values))
+                log.debug('Got a new pm2.5 AQI value: %s', pm2_5_aqi)
 
                 led.set_light(pm2_5_aqi)
             else:
-                log.debug(f'Outside active time (start: {start_time}, end: {end_time}), lights off.')
+                log.debug('Outside active time (start: %d:00, end: %d:00), lights off.',
+                          start_time // 3600, end_time // 3600)
                 led.off()
 
-            sleep(update_frequency)
+            # Sleep until the next scheduled update, so the time spent updating doesn't add drift.
+            next_run += update_frequency
+            now = monotonic()
+            if now - next_run > update_frequency:
+                # Missed more than a full period (e.g. suspend), reschedule rather than catch up.
+                next_run = now + update_frequency
+            sleep(max(0, next_run - now))
 
         except KeyboardInterrupt:
             log.info('Shutting down the system...')
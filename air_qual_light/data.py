@@ -1,87 +1,121 @@
-import json
 import logging
 
-from typing import List, Optional
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Union
 
 import numpy as np
 
+try:
+    # Considerably faster parsing on the Raspberry Pi, fall back on the standard library.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 
 log = logging.getLogger()
 
 
 class Sensor():
 
+    __slots__ = ('name', 'id', 'api_url', '_pm2_5_atm', '_str')
+
     def __init__(self, name: str, sensor_str: str, api_url_tmpl: str):
 
         self.name = name
         self.id = int(sensor_str.strip())
-        self._data_dict = None
+        self._pm2_5_atm = None
+        self._str = None
 
-        self._api_url_tmpl = api_url_tmpl
+        self.api_url = api_url_tmpl.format(sensor_id=self.id)
 
     def __repr__(self) -> str:
         return self.__str__()
 
     def __str__(self) -> str:
-        return f'<Sensor, name: {self.name}, id: {self.id}, pm2.5 AQI: {self.us_epa_pm2_4_aqi}>'
+        # Built at most once per update, and only when actually logged.
+        if self._str is None:
+            self._str = f'<Sensor, name: {self.name}, id: {self.id}, pm2.5 AQI: {self.us_epa_pm2_4_aqi}>'
+        return self._str
 
     def update_data(self, json_str: str):
-        self._data_dict = json.loads(json_str)
+        self.update_from_dict(json_loads(json_str)['sensor'])
 
-    @property
-    def api_url(self) -> str:
-        return self._api_url_tmpl.format(sensor_id=self.id)
+    def update_from_dict(self, sensor_dict: Dict[str, Any]):
+        # Parse once per update, the AQI for all sensors is calculated in one batch by the caller.
+        self._pm2_5_atm = float(sensor_dict['pm2.5_atm'])
+        self._str = None
+
+    def clear(self):
+        # Drop the last reading, e.g. when an update failed, so stale data is never used.
+        self._pm2_5_atm = None
+        self._str = None
 
     @property
     def pm2_5_atm(self) -> Optional[float]:
-        if self._data_dict is not None:
-            results = float(self._data_dict['sensor']['pm2.5_atm'])
-            return results
-
-        return None
+        return self._pm2_5_atm
 
     @property
     def us_epa_pm2_4_aqi(self) -> Optional[float]:
-        if self.pm2_5_atm is None:
+        if self._pm2_5_atm is None:
             return None
-        else:
-            return calculate_aqi(self.pm2_5_atm)
+        return calculate_aqi(self._pm2_5_atm)
 
 
-def remap(value: float, low1: float, high1: float, low2: float, high2: float) -> float:
-    return low2 + (high2 - low2) * (value - low1) / (high1 - low1)
+# US EPA pm2.5 AQI breakpoints as (pm low, pm high, AQI low, AQI high), lower bounds are exclusive.
+_AQI_BANDS = (
+    (0, 12, 0, 50),
+    (12, 35.5, 50, 100),
+    (35.5, 55.5, 100, 150),
+    (55.5, 150.5, 150, 200),
+    (150.5, 250.5, 200, 300),
+    (250.5, 350.5, 300, 400),
+    (350.5, 500.5, 400, 500),
+)
+_AQI_MAX_PM, _AQI_MAX = 500, 500
+
+# Precompute each band as (pm low, AQI low, slope), so a lookup is a binary search and one multiply-add.
+_AQI_TABLE = tuple((pm_low, aqi_low, (aqi_high - aqi_low) / (pm_high - pm_low))
+                   for pm_low, pm_high, aqi_low, aqi_high in _AQI_BANDS)
+_AQI_PM_LOWS = tuple(pm_low for pm_low, _, _ in _AQI_TABLE)
+_AQI_PM_LOWS_ARRAY, _AQI_LOWS_ARRAY, _AQI_SLOPES_ARRAY = np.array(_AQI_TABLE, dtype=np.float64).T
 
 
 def calculate_aqi(pm: float) -> float:
-    if pm > 500:
-        aqi = 500
-    elif pm > 350.5:
-        aqi = remap(pm, 350.5, 500.5, 400, 500)
-    elif pm > 250.5:
-        aqi = remap(pm, 250.5, 350.5, 300, 400)
-    elif pm > 150.5:
-        aqi = remap(pm, 150.5, 250.5, 200, 300)
-    elif pm > 55.5:
-        aqi = remap(pm, 55.5, 150.5, 150, 200)
-    elif pm > 35.5:
-        aqi = remap(pm, 35.5, 55.5, 100, 150)
-    elif pm > 12:
-        aqi = remap(pm, 12, 35.5, 50, 100)
-    elif pm > 0:
-        aqi = remap(pm, 0, 12, 0, 50)
-    else:
-        aqi = pm
-    return aqi
-
-
-def calculate_concencus_aqi(pm_values: List[float], max_deviations: float = 2.0) -> float:
-
-    pm_values = np.array(pm_values).flatten()  # Flatten nested list if provided.
+    if pm > _AQI_MAX_PM:
+        return _AQI_MAX
+
+    band = bisect_left(_AQI_PM_LOWS, pm) - 1
+    if band < 0:
+        return pm
+
+    pm_low, aqi_low, slope = _AQI_TABLE[band]
+    return aqi_low + slope * (pm - pm_low)
+
+
+def calculate_aqi_array(pm: np.ndarray) -> np.ndarray:
+
+    pm = np.asarray(pm, dtype=np.float64)
+
+    band = np.searchsorted(_AQI_PM_LOWS_ARRAY, pm, side='left') - 1
+    in_band = np.maximum(band, 0)
+    aqi = _AQI_LOWS_ARRAY[in_band] + _AQI_SLOPES_ARRAY[in_band] * (pm - _AQI_PM_LOWS_ARRAY[in_band])
+
+    return np.where(pm > _AQI_MAX_PM, _AQI_MAX, np.where(band < 0, pm, aqi))
+
+
+def calculate_concencus_aqi(pm_values: Union[np.ndarray, List[float]], max_deviations: float = 2.0) -> float:
+
+    # Flatten nested list if provided, arrays are used as is without a copy.
+    pm_values = np.asarray(pm_values, dtype=np.float64).ravel()
     mean = np.mean(pm_values)
-    std = np.std(pm_values)
-    distance_from_mean = abs(pm_values - mean)
+    distance_from_mean = np.abs(pm_values - mean)
+    std = np.sqrt(np.mean(distance_from_mean ** 2))  # np.std without recomputing the mean.
     not_outlier = distance_from_mean < max_deviations * std
 
-    log.debug(f'pm_values: {pm_values}, not_outlier: {not_outlier}')
+    log.debug('pm_values: %s, not_outlier: %s', pm_values, not_outlier)
+
+    if not not_outlier.any():
+        # Only happens when std is zero (e.g. a single sensor), every value equals the mean.
+        return mean
 
     return np.mean(pm_values[not_outlier])
@@ -1,8 +1,13 @@
 import logging
+import re
 
+from bisect import bisect_right
 from configparser import ConfigParser
+from dataclasses import dataclass
 from time import sleep
-from typing import Tuple
+from typing import Dict, Tuple
+
+import numpy as np
 
 from air_qual_light import RASPBERRY_PI_HARDWARE
 
@@ -29,72 +34,113 @@ else:
 
 log = logging.getLogger()
 
+# AQI level config values, formatted as: r,g,b|threshold
+_LEVEL_RE = re.compile(r'\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\|\s*(\d+)\s*$')
+
+
+@dataclass(frozen=True)
+class NeopixelConfig:
+    number_of_leds: int
+    board_connection: str
+    light_intensity: float
+    use_half: bool
+    levels: Tuple[Tuple[int, str, Tuple[int, int, int]], ...]  # (threshold, name, rgb) sorted by threshold
+
+
+def _parse_neopixel_config(config: Dict[str, str]) -> NeopixelConfig:
+
+    # Load AQI color and levels
+    levels = []
+    for k, v in config.items():
+        if k.startswith('level_'):
+
+            match = _LEVEL_RE.match(v)
+            if match is None:
+                raise ValueError(f'Invalid AQI level {k}: {v!r}, expected format: r,g,b|threshold')
+
+            r, g, b, level_th = map(int, match.groups())
+            levels.append((level_th, k[6:], (r, g, b)))
+
+    use_half = config['use_half'].strip().lower()
+    if use_half not in ConfigParser.BOOLEAN_STATES:
+        raise ValueError(f'Invalid use_half: {config["use_half"]!r}, expected a boolean (e.g. True or False)')
+
+    return NeopixelConfig(
+        number_of_leds=int(config['number_of_leds']),
+        board_connection=config['board_connection'],
+        light_intensity=float(config['light_intensity']),
+        use_half=ConfigParser.BOOLEAN_STATES[use_half],
+        levels=tuple(sorted(levels))
+    )
+
 
 class Led():
 
-    def __init__(self, config: ConfigParser, color_order: str = GRB):
+    def __init__(self, config: Dict[str, str], color_order: str = GRB):
 
-        # Setup Neopixel
-        config = config['neopixel']
+        # Setup Neopixel from the [neopixel] config section, parsed once
+        self.config = _parse_neopixel_config(config)
 
-        self.number_of_leds = int(config['number_of_leds'])
-        self.use_half = config.getboolean('use_half')
+        self.number_of_leds = self.config.number_of_leds
+        self.use_half = self.config.use_half
+        self.levels = self.config.levels
+        self._level_thresholds = [level_th for level_th, _, _ in self.levels]
 
         self.pixels = NeoPixel(
-            getattr(board, config['board_connection']) if RASPBERRY_PI_HARDWARE else None,
+            getattr(board, self.config.board_connection) if RASPBERRY_PI_HARDWARE else None,
             self.number_of_leds,
-            brightness=float(config['light_intensity']),
+            brightness=self.config.light_intensity,
             auto_write=False,
             pixel_order=color_order
         )
 
-        # Load AQI color and levels
-        self.levels = []
-        for k, v in config.items():
-            if k.startswith('level_'):
-
-                level_str = k[6:]
-                level_rgb, level_th = v.strip().split('|')
-
-                level_rgb = tuple([int(v) for v in level_rgb.split(',')])
-                level_th = int(level_th)
+        self.__do_odd = 0
+        self._last_rgb = None
 
-                self.levels.append((level_th, level_str, level_rgb))
+        # Pixels lit on even and odd frames, every pixel unless only half of them should be used.
+        if self.use_half:
+            even = np.arange(self.number_of_leds) % 2 == 0
+            self._lit_masks = (even, ~even)
+        else:
+            every = np.ones(self.number_of_leds, dtype=bool)
+            self._lit_masks = (every, every)
+        self._frame = np.zeros((self.number_of_leds, 3), dtype=np.uint8)
 
-        self.levels.sort()
+    def set_light(self, pm2_5_aqi: float):
 
-        self.__do_odd = 0
+        # First level with a threshold above the AQI, levels are sorted by threshold.
+        idx = bisect_right(self._level_thresholds, pm2_5_aqi)
+        if idx < len(self.levels):
+            _, level_str, level_rgb = self.levels[idx]
 
-    def set_light(self, pm2_5_aqi: float):
+            # Nothing to redraw, unless alternating halves where every update flips the lit pixels.
+            if level_rgb == self._last_rgb and not self.use_half:
+                return
 
-        for level_th, level_str, level_rgb in self.levels:
-            if pm2_5_aqi < level_th:
-                log.info(f'Setting new light level to: {level_str} for pm2.5 AQI: {pm2_5_aqi}')
-                self.set_rgb(level_rgb)
-                break
+            log.info(f'Setting new light level to: {level_str} for pm2.5 AQI: {pm2_5_aqi}')
+            self.set_rgb(level_rgb)
 
     def set_rgb(self, rgb: Tuple[int]):
 
-        log.debug(f'Update LED with RGB: {rgb}')
-        for idx in range(self.number_of_leds):
-            if idx % 2 == 0 + self.__do_odd or not self.use_half:
-                self.pixels[idx] = rgb
-            else:
-                self.pixels[idx] = (0, 0, 0)
+        log.debug('Update LED with RGB: %s', rgb)
+        self._frame[:] = 0
+        self._frame[self._lit_masks[self.__do_odd]] = rgb
+        self.pixels[:] = [tuple(pixel) for pixel in self._frame.tolist()]
 
         self.__do_odd = 0 if self.__do_odd == 1 else 1
         self.pixels.show()
+        self._last_rgb = rgb
 
     def working_light(self, loops: int = 5):
 
+        # Frames are the same for every loop, build them once and write each in one slice.
+        frames = [[(100, 100, 100) if idx % 8 == i else (0, 0, 10) for idx in range(16)] for i in range(16)]
+
+        pixels = self.pixels
         for _ in range(loops):
-            for i in range(16):
-                for idx in range(16):
-                    if idx % 8 == i:
-                        self.pixels[idx] = (100, 100, 100)
-                    else:
-                        self.pixels[idx] = (0, 0, 10)
-                self.pixels.show()
+            for frame in frames:
+                pixels[0:16] = frame
+                pixels.show()
                 sleep(0.2)
 
         self.off()
@@ -102,3 +148,4 @@ class Led():
     def off(self):
         self.pixels.fill((0, 0, 0))
         self.pixels.show()
+        self._last_rgb = None
@@ -1,33 +1,154 @@
 import asyncio
-from typing import List
+import atexit
+import logging
+
+from typing import Any, Awaitable, Dict, List, Optional
 
 import aiohttp
 
-from air_qual_light.data import Sensor
+from air_qual_light.data import Sensor, json_loads
+
+try:
+    # libuv based event loop with less overhead than asyncio's, fall back on the default one.
+    from uvloop import new_event_loop
+except ImportError:
+    from asyncio import new_event_loop
+
+
+log = logging.getLogger()
+
+# Sensor fields requested from the multiple sensors endpoint, sensor_index is always included.
+BULK_FIELDS = ('pm2.5_atm',)
+
+# Max number of sensors requested at the same time.
+MAX_CONCURRENT_REQUESTS = 8
+
+# One long lived session per API key, keeps connections (and TLS) to the API alive between updates.
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+# Sessions are bound to the loop they were created in, so all updates run in the same loop.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
 
+def get_session(api_key: str) -> aiohttp.ClientSession:
 
-async def fetch_json(session: aiohttp.ClientSession, sensor: Sensor):
+    session = _sessions.get(api_key)
+    if session is None or session.closed:
+        header = {
+            'Accepts': 'application/json',
+            'X-API-Key': api_key
+        }
+        connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60)
+        session = _sessions[api_key] = aiohttp.ClientSession(headers=header, connector=connector)
 
-    async with session.get(sensor.api_url) as response:
-        sensor.update_data(await response.text())
+    return session
 
 
-async def get_sensor_data(sensors: List[Sensor], api_key: str):
+async def close_sessions():
+
+    while _sessions:
+        _, session = _sessions.popitem()
+        await session.close()
+
+
+async def fetch_json(session: aiohttp.ClientSession, sensor: Sensor, semaphore: asyncio.Semaphore):
+
+    async with semaphore:
+        async with session.get(sensor.api_url) as response:
+            response.raise_for_status()
+            # Parse the raw body, skips decoding it to a str first.
+            sensor.update_from_dict(json_loads(await response.read())['sensor'])
+
+
+async def get_sensor_data(session: aiohttp.ClientSession, sensors: List[Sensor]):
 
     tasks = []
-    header = {
-        'Accepts': 'application/json',
-        'X-API-Key': api_key
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    for sensor in sensors:
+        tasks.append(fetch_json(session, sensor, semaphore))
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    errors = [(sensor, result) for sensor, result in zip(sensors, results) if isinstance(result, Exception)]
+    for sensor, error in errors:
+        log.warning(f'Failed to update sensor {sensor.name} ({sensor.id}): {error}')
+        sensor.clear()
+
+    # A failing sensor is left out until it reports again, only fail when none could be updated.
+    if errors and len(errors) == len(sensors):
+        raise errors[0][1]
+
+
+async def get_bulk_sensor_data(session: aiohttp.ClientSession, sensors: List[Sensor], api_url: str):
+
+    # An empty show_only would query every sensor, not none of them.
+    if not sensors:
+        return
+
+    # Several config entries may share a sensor id, request it once and update all of them.
+    sensors_by_id: Dict[int, List[Sensor]] = {}
+    for sensor in sensors:
+        sensors_by_id.setdefault(sensor.id, []).append(sensor)
+
+    params = {
+        'fields': ','.join(BULK_FIELDS),
+        'show_only': ','.join(str(sensor_id) for sensor_id in sensors_by_id)
     }
 
-    async with aiohttp.ClientSession(headers=header) as session:
-        for sensor in sensors:
-            tasks.append(fetch_json(session, sensor))
+    async with session.get(api_url, params=params) as response:
+        response.raise_for_status()
+        data = json_loads(await response.read())
+
+    # One row per sensor, with values ordered as in fields.
+    updated = 0
+    fields = data['fields']
+    for row in data['data']:
+        sensor_dict = dict(zip(fields, row))
+        for sensor in sensors_by_id.pop(sensor_dict['sensor_index'], []):
+            try:
+                sensor.update_from_dict(sensor_dict)
+            except Exception as e:
+                # E.g. a null reading from an offline channel.
+                log.warning(f'Failed to update sensor {sensor.name} ({sensor.id}): {e}')
+                sensor.clear()
+            else:
+                updated += 1
+
+    for missing in sensors_by_id.values():
+        for sensor in missing:
+            log.warning(f'No data for sensor {sensor.name} ({sensor.id}) in bulk response')
+            sensor.clear()
+
+    # A failing sensor is left out until it reports again, only fail when none could be updated.
+    if not updated:
+        raise ValueError('No sensor could be updated from the bulk response')
 
-        await asyncio.gather(*tasks)
+
+async def _with_session(api_key: str, fetch, *args):
+    # The session has to be created from within the running event loop.
+    await fetch(get_session(api_key), *args)
+
+
+def _run(coro: Awaitable) -> Any:
+    # asyncio.run() would close the loop, and with it the pooled sessions, after every update.
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = new_event_loop()
+
+    return _loop.run_until_complete(coro)
 
 
 def update_sensor_data(sensors: List[Sensor], api_key: str):
+    _run(_with_session(api_key, get_sensor_data, sensors))
+
+
+def update_sensor_data_bulk(sensors: List[Sensor], api_key: str, api_url: str):
+    _run(_with_session(api_key, get_bulk_sensor_data, sensors, api_url))
+
+
+@atexit.register
+def _close_at_exit():
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(get_sensor_data(sensors, api_key))
+    if _loop is not None and not _loop.is_closed():
+        _loop.run_until_complete(close_sessions())
+        _loop.close()
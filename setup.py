@@ -12,6 +12,8 @@ requirements = [
     'aiohttp',
     'Click',
     'numpy',
+    'orjson',
+    'uvloop; platform_system != "Windows"',
     'rpi_ws281x',
     'adafruit-circuitpython-neopixel'
 ]